@@ -1,3 +1,5 @@
+import os
+
 import streamlit as st
 import pandas as pd
 
@@ -5,15 +7,43 @@ import pandas as pd
 from functions import (
     load_membrane_specs,       # YAMLをロード
     simulate_ro_logmean,       # ログ平均モデルでのRO計算
-    append_result_to_json,     # 計算結果をJSONファイルへ追記
-    load_calculation_history   # JSONファイルから履歴を読み込む
+    append_result_to_json,     # 計算結果をJSON Linesファイルへ追記
+    load_calculation_history   # JSON Linesファイルから履歴を読み込む
 )
 
-def main():
-    st.title("RO Simulation with Log-Mean Model + JSON History Logging")
+@st.cache_data
+def _load_specs(yaml_path, mtime):
+    """
+    膜スペックをキャッシュ付きで読み込む。
+    mtimeをキャッシュキーに含めることで、YAML更新時に自動で再読込される。
+    """
+    return load_membrane_specs(yaml_path)
 
-    # 1) YAMLファイルから膜スペックをロード
-    specs = load_membrane_specs("membrane_specs.yaml")
+
+@st.cache_data(max_entries=512)
+def _cached_simulation(feed_flow, feed_tds, feed_press, temperature,
+                       product_name, num_elements, membrane_data):
+    """
+    simulate_ro_logmeanのキャッシュ付きラッパー。
+    同じ入力の組み合わせで再実行した場合は計算せずに前回の結果を返す。
+    """
+    return simulate_ro_logmean(
+        feed_flow=feed_flow,
+        feed_tds=feed_tds,
+        feed_press=feed_press,
+        temperature=temperature,
+        product_name=product_name,
+        num_elements=num_elements,
+        membrane_data=membrane_data
+    )
+
+
+@st.fragment
+def _simulation_panel(specs):
+    """
+    入力UI・シミュレーション実行・結果表示をまとめたフラグメント。
+    この中のウィジェット操作ではフラグメントだけが再実行され、スクリプト全体は再実行されない。
+    """
     membrane_list = list(specs.keys())  # 例: ["CPA5-LD", "ESPA2-LD", "ESPA2-MAX"]
 
     # 2) ユーザー入力UI
@@ -27,37 +57,49 @@ def main():
 
     # 3) シミュレーション実行ボタン
     if st.button("Run Simulation"):
-        # 入力値をもとにRO計算を実行
-        result = simulate_ro_logmean(
-            feed_flow=feed_flow,
-            feed_tds=feed_tds,
-            feed_press=feed_press,
-            temperature=temperature,
-            product_name=selected_product,
-            num_elements=num_elements,
-            membrane_data=specs
-        )
-
-        # 結果表示
-        st.subheader("Simulation Results")
-        for k, v in result.items():
-            st.write(f"{k}: {v}")
-
-        # JSONファイルに計算結果を追記
-        append_result_to_json(result, json_path="calculation_history.json")
-        st.success("Calculation result has been saved to JSON history.")
+        # 入力値をもとにRO計算を実行 (物理的な解が得られない入力ではエラーを表示)
+        try:
+            result = _cached_simulation(
+                feed_flow=feed_flow,
+                feed_tds=feed_tds,
+                feed_press=feed_press,
+                temperature=temperature,
+                product_name=selected_product,
+                num_elements=num_elements,
+                membrane_data=specs
+            )
+        except ValueError as e:
+            st.error(f"Simulation failed: {e}")
+        else:
+            # 結果表示
+            st.subheader("Simulation Results")
+            st.table(pd.Series(result, name="Value"))
+
+            # JSON Linesファイルに計算結果を追記
+            append_result_to_json(result, json_path="calculation_history.jsonl")
+            st.success("Calculation result has been saved to JSON history.")
+
+
+def main():
+    st.title("RO Simulation with Log-Mean Model + JSON History Logging")
+
+    # 1) YAMLファイルから膜スペックをロード
+    specs_path = "membrane_specs.yaml"
+    specs = _load_specs(specs_path, os.path.getmtime(specs_path))
+
+    # 2), 3) 入力UIとシミュレーション実行 (フラグメント内でのみ再実行)
+    _simulation_panel(specs)
 
     # 4) 履歴閲覧ボタン
     st.subheader("Calculation History")
     if st.button("View Calculation History"):
-        # JSONファイルから履歴を読み込み
-        history = load_calculation_history("calculation_history.json")
-        if len(history) == 0:
+        # JSON Linesファイルから履歴を読み込み
+        history = load_calculation_history("calculation_history.jsonl")
+        if history.empty:
             st.warning("No history found.")
         else:
-            # pandasでDataFrameに変換し、テーブル表示
-            df = pd.DataFrame(history)
-            st.dataframe(df)
+            # DataFrameをそのままテーブル表示
+            st.dataframe(history)
 
 if __name__ == "__main__":
     main()
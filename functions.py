@@ -1,29 +1,99 @@
 import math
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
 import yaml
-import json
+import orjson
 import os
-from datetime import datetime
+import time
+import pandas as pd
+
+# numbaが利用可能ならエレメント計算をJITコンパイルする（requirements.txtに記載。未インストール時はそのままPythonで実行）
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+# libyaml(Cバインディング)があれば高速なCSafeLoaderを使う
+# (PyYAMLをlibyaml付きでビルドするには、事前に libyaml-dev 等をインストールしておく)
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# 膜スペック1製品分 (フィールド名はmembrane_specs.yamlのキーと同じ)
+MembraneSpec = namedtuple(
+    "MembraneSpec",
+    "A_value B_value area_m2 default_dP_element default_osm_coef"
+)
 
 def load_membrane_specs(yaml_path: str):
     """
-    YAMLファイルから膜スペック情報を読み込んで辞書を返す。
-    例: data['membranes']['CPA5-LD'] -> { A_value, B_value, ... }
+    YAMLファイルから膜スペック情報を読み込み、製品名 -> MembraneSpec の辞書を返す。
+    例: specs['CPA5-LD'].A_value
     """
     with open(yaml_path, 'r', encoding='utf-8') as f:
-        data = yaml.safe_load(f)
-    return data['membranes']
+        data = yaml.load(f, Loader=SafeLoader)
+    return {name: MembraneSpec(**values) for name, values in data['membranes'].items()}
 
 
+# エレメント計算の反復打ち切り条件
+MAX_ITER = 100      # 最大反復回数
+REL_TOL = 1e-6      # 濃縮水濃度の相対変化がこれ未満になれば収束とみなす
+
+
+@njit(cache=True)
+def _element_balance(Cc, qf_in, cf_in, salt_in, p_avg, k_A, k_B, osm_coef):
+    """
+    濃縮水濃度Ccを仮定したときの塩収支の残差Rとその微分dR/dCc、透過水量Qpとその微分dQp/dCc、
+    塩透過量Jsを返す。
+    R = Cc*(qf_in - Qp) - (salt_in - Js) はCcについて単調増加で、R=0となるCcが解となる。
+    """
+    # ログ平均塩濃度とそのCcについての偏微分 (cf_in≈Ccでは極限値、どちらかが0以下なら0)
+    if cf_in <= 0.0 or Cc <= 0.0:
+        cf_avg = 0.0
+        dcf_avg = 0.0
+    elif abs(cf_in - Cc) > 1e-6 * Cc:
+        u = math.log(cf_in / Cc)
+        cf_avg = (cf_in - Cc) / u
+        dcf_avg = (cf_avg / Cc - 1.0) / u
+    else:
+        cf_avg = 0.5 * (cf_in + Cc)
+        dcf_avg = 0.5
+
+    # 水透過量 (有効駆動力が0以下なら透過しない)
+    NDP = p_avg - osm_coef * cf_avg
+    if NDP > 0.0:
+        Qp = k_A * NDP
+        dQp = -k_A * osm_coef * dcf_avg
+    else:
+        Qp = 0.0
+        dQp = 0.0
+
+    # 塩透過量
+    Js = k_B * cf_avg
+
+    R = Cc * (qf_in - Qp) - salt_in + Js
+    dR = (qf_in - Qp) - Cc * dQp + k_B * dcf_avg
+    return R, dR, Qp, dQp, Js
+
+
+@njit(cache=True)
 def calc_element_logmean(qf_in, cf_in, pin,
-                         area_m2, A_value, B_value,
+                         area_m2, A_h, B_h,
                          dP_element, osm_coef):
     """
-    ログ平均モデルを用いて、1エレメントの出口条件を計算する（簡易反復）。
+    ログ平均モデルを用いて、1エレメントの出口条件を計算する。
+    濃縮水濃度Ccについての塩収支の残差を、解を挟む区間で保護したニュートン法で解く。
+    MAX_ITER回以内に収束しない場合はValueErrorを送出する。
     入力:
       qf_in, cf_in, pin:  エレメント入口の流量[m3/h], 塩濃度[mg/L], 圧力[bar]
       area_m2:   エレメントの有効膜面積 [m^2]
-      A_value:   水透過係数 [m^3/(m^2·s·bar)]
-      B_value:   塩透過係数 [m^3/(m^2·s)]
+      A_h:       水透過係数 [m^3/(m^2·h·bar)] (温度補正・時間単位換算済み)
+      B_h:       塩透過係数 [m^3/(m^2·h)] (温度補正・時間単位換算済み)
       dP_element: エレメントでの圧力損失 [bar]
       osm_coef:  浸透圧(bar)= osm_coef * TDS(mg/L) の近似係数
     出力: (Qp, Cp, Qc, Cc, p_out)
@@ -33,67 +103,97 @@ def calc_element_logmean(qf_in, cf_in, pin,
       Cc: 濃縮水塩濃度 [mg/L]
       p_out: エレメント出口圧力 [bar]
     """
-    # エレメント出口圧力の初期仮定
-    p_out_approx = max(pin - dP_element, 0.0)
-
-    # 透過水量と塩濃度の初期仮定
-    Qp_guess = 1.0   
-    Cp_guess = 50.0  
-
-    # 簡易的に反復して収束
-    for _ in range(5):
-        # 濃縮水の流量・濃度
-        Qc_guess = qf_in - Qp_guess
-        salt_in = qf_in * cf_in
-        salt_p  = Qp_guess * Cp_guess
-        salt_c  = salt_in - salt_p
-        if Qc_guess > 1e-12:
-            Cc_guess = salt_c / Qc_guess
-        else:
-            Cc_guess = cf_in
+    # エレメント出口圧力
+    p_out = max(pin - dP_element, 0.0)
 
-        # ログ平均圧力
-        if p_out_approx < 1e-5:
-            p_out_approx = 1e-5
-        p_avg = (pin - p_out_approx) / math.log(pin / p_out_approx)
+    # 入口塩量は反復中に変化しないため事前に計算
+    salt_in = qf_in * cf_in
 
-        # ログ平均塩濃度
-        if Cc_guess < 1e-5:
-            Cc_guess = 1e-5
-        if abs(cf_in - Cc_guess) > 1e-10:
-            cf_avg = (cf_in - Cc_guess) / math.log(cf_in / Cc_guess)
-        else:
-            cf_avg = cf_in
-
-        # 浸透圧(平均)
-        pi_f_avg = osm_coef * cf_avg
-
-        # 有効駆動力
-        NDP = p_avg - pi_f_avg
-        if NDP < 0:
-            NDP = 0.0
-
-        # 単位換算 (s→h)
-        A_h = A_value * 3600.0
-        B_h = B_value * 3600.0
-
-        # 水透過量
-        Qp_new = A_h * NDP * area_m2  # [m3/h]
-        # 塩透過量
-        Js = B_h * cf_avg * area_m2   # [mg/h]
-        if Qp_new > 1e-12:
-            Cp_new = Js / Qp_new
+    # ログ平均圧力 (入口・出口圧力は反復中に変化しないため事前に計算)
+    # (入口圧力が0以下だと対数が定義できないため、numbaの有無に関わらずエラーとする)
+    if pin <= 0.0:
+        raise ValueError("Element inlet pressure must be positive.")
+    p_out_approx = max(p_out, 1e-5)
+    if abs(pin - p_out_approx) > 1e-10:
+        p_avg = (pin - p_out_approx) / math.log(pin / p_out_approx)
+    else:
+        p_avg = pin
+
+    # 入口流量が0なら透過も起こらない
+    if qf_in <= 0.0:
+        return 0.0, cf_in, qf_in, cf_in, p_out
+
+    # 単位面積あたりの係数に膜面積を掛けておく
+    k_A = A_h * area_m2
+    k_B = B_h * area_m2
+
+    # 解を挟む区間 [lo, hi] を求める
+    # (物理的な解は Qp <= qf_in の範囲にあり、そこではRがCcについて単調増加となる)
+    # 入口濃度での透過水量Qp0を使った塩収支の濃縮水濃度は、Qp0 >= k_B なら解の上限になり、
+    # 浸透圧の影響が小さい通常の条件では解に非常に近い
+    Qp0 = k_A * max(p_avg - osm_coef * cf_in, 0.0)
+    if k_B <= Qp0 < qf_in:
+        lo = cf_in
+        hi = (salt_in - k_B * cf_in) / (qf_in - Qp0)
+    else:
+        # それ以外は Cc=0 (R=-salt_in<=0) を下限とし、Qp <= qf_in かつ R >= 0 となるまでhiを倍々に広げる
+        lo = 0.0
+        hi = max(cf_in, 1e-5)
+        bracketed = False
+        for _ in range(MAX_ITER):
+            R, dR, Qp, dQp, Js = _element_balance(hi, qf_in, cf_in, salt_in,
+                                                  p_avg, k_A, k_B, osm_coef)
+            if R >= 0.0 and Qp <= qf_in:
+                bracketed = True
+                break
+            lo = hi
+            hi *= 2.0
+        if not bracketed:
+            raise ValueError("No physical solution: the element would permeate all of its feed.")
+
+    # ニュートン法で反復し、区間外に出る場合は二分法に切り替える
+    # (Qp > qf_in となる点は物理的な解より左側にあるものとして扱う)
+    # 次の更新幅によるCc・Qp・Qc(=qf_in-Qp)の変化がいずれも相対REL_TOL未満なら、
+    # その点の評価値 (Qp, Js) をそのまま確定値とする (確定値のための再評価はしない)
+    Cc_guess = hi
+    converged = False
+    for _ in range(MAX_ITER):
+        R, dR, Qp, dQp, Js = _element_balance(Cc_guess, qf_in, cf_in, salt_in,
+                                              p_avg, k_A, k_B, osm_coef)
+        physical = Qp <= qf_in
+        if R == 0.0 and physical:
+            converged = True
+            break
+        if R > 0.0 and physical:
+            hi = Cc_guess
         else:
-            Cp_new = cf_in
+            lo = Cc_guess
 
-        Qp_guess = Qp_new
-        Cp_guess = Cp_new
+        if physical and dR > 0.0:
+            Cc_new = Cc_guess - R / dR
+        else:
+            Cc_new = 0.5 * (lo + hi)
+        if Cc_new <= lo or Cc_new >= hi:
+            Cc_new = 0.5 * (lo + hi)
+
+        step = abs(Cc_new - Cc_guess)
+        if (step < REL_TOL * max(Cc_new, 1e-5)
+                and abs(dQp) * step <= REL_TOL * max(min(Qp, qf_in - Qp), 1e-12)):
+            converged = True
+            break
+        Cc_guess = Cc_new
+    if not converged:
+        raise ValueError("Element calculation did not converge.")
 
     # 反復後の確定値
-    Qp = Qp_guess
-    Cp = Cp_guess
+    # 区間が Qp = qf_in の境界に縮んだ場合は、塩透過量が入口塩量を上回る非物理的な状態
+    if Qp > qf_in or Js > salt_in:
+        raise ValueError("No physical solution: the element would permeate all of its feed.")
+    if Qp > 1e-12:
+        Cp = Js / Qp
+    else:
+        Cp = cf_in
     Qc = qf_in - Qp
-    salt_in = qf_in * cf_in
     salt_p  = Qp * Cp
     salt_c  = salt_in - salt_p
     if Qc > 1e-12:
@@ -101,11 +201,23 @@ def calc_element_logmean(qf_in, cf_in, pin,
     else:
         Cc = cf_in
 
-    p_out = max(pin - dP_element, 0.0)
-
     return Qp, Cp, Qc, Cc, p_out
 
 
+@lru_cache(maxsize=4096)
+def _calc_element_cached(qf_in, cf_in, pin,
+                         area_m2, A_h, B_h,
+                         dP_element, osm_coef):
+    """
+    calc_element_logmeanのメモ化ラッパー。
+    同じ入口条件のエレメントは再計算せずに前回の結果を返す
+    (例: エレメント本数だけを変えた再計算では、上流側エレメントの結果を再利用できる)。
+    """
+    return calc_element_logmean(qf_in, cf_in, pin,
+                                area_m2, A_h, B_h,
+                                dP_element, osm_coef)
+
+
 def simulate_ro_logmean(
     feed_flow,    
     feed_tds,     
@@ -120,15 +232,15 @@ def simulate_ro_logmean(
     product_nameで選択した膜スペック(A, B, areaなど)を使用する。
     """
     # 1) 製品のスペックを取得
-    if product_name not in membrane_data:
-        raise ValueError(f"Product '{product_name}' not found in membrane data.")
-
-    spec = membrane_data[product_name]
-    A_value = spec["A_value"]  
-    B_value = spec["B_value"]  
-    area_m2 = spec["area_m2"]  
-    dP_element = spec["default_dP_element"]  
-    osm_coef = spec["default_osm_coef"]     
+    try:
+        spec = membrane_data[product_name]
+    except KeyError:
+        raise ValueError(f"Product '{product_name}' not found in membrane data.") from None
+    A_value = spec.A_value  
+    B_value = spec.B_value  
+    area_m2 = spec.area_m2  
+    dP_element = spec.default_dP_element  
+    osm_coef = spec.default_osm_coef     
 
     # 2) 温度補正 (例: 25℃基準、1℃下がるごとに3%ダウン)
     ref_temp = 25.0
@@ -140,6 +252,10 @@ def simulate_ro_logmean(
     A_corr = A_value * tcf
     B_corr = B_value * tcf
 
+    # 単位換算 (s→h) はエレメントごとに繰り返さず一度だけ行う
+    A_h = A_corr * 3600.0
+    B_h = B_corr * 3600.0
+
     # 3) エレメント直列計算
     q_in = feed_flow
     c_in = feed_tds
@@ -149,15 +265,10 @@ def simulate_ro_logmean(
     total_salt_perm = 0.0
 
     for i in range(num_elements):
-        Qp, Cp, Qc, Cc, p_out = calc_element_logmean(
-            qf_in=q_in,
-            cf_in=c_in,
-            pin=p_in,
-            area_m2=area_m2,
-            A_value=A_corr,
-            B_value=B_corr,
-            dP_element=dP_element,
-            osm_coef=osm_coef
+        Qp, Cp, Qc, Cc, p_out = _calc_element_cached(
+            q_in, c_in, p_in,
+            area_m2, A_h, B_h,
+            dP_element, osm_coef
         )
         total_permeate += Qp
         total_salt_perm += (Qp * Cp)
@@ -190,43 +301,261 @@ def simulate_ro_logmean(
 
 
 # ================================
-# JSON形式での履歴管理機能
+# パラメータスイープ用のバッチ計算
 # ================================
-def append_result_to_json(result_dict, json_path="calculation_history.json"):
+def _element_balance_batch(Cc, qf_in, cf_in, salt_in, p_avg, k_A, k_B, osm_coef):
     """
-    計算結果をJSONファイルに追記する。
-    - JSONファイルが存在しない場合は新規作成。
-    - 既存ファイルがあれば読み込み、リストに結果をappendして再度書き込む。
+    _element_balanceのNumPy配列版。R、dR/dCc、Qp、dQp/dCc、Jsを返す。
     """
-    # 1) 既存のJSONをロード
-    if os.path.isfile(json_path):
-        with open(json_path, "r", encoding='utf-8') as f:
-            data = json.load(f)
-    else:
-        data = []  # 新規
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # ログ平均塩濃度とそのCcについての偏微分 (cf_in≈Ccでは極限値、どちらかが0以下なら0)
+        positive = (cf_in > 0.0) & (Cc > 0.0)
+        u = np.log(cf_in / Cc)
+        far = np.abs(cf_in - Cc) > 1e-6 * Cc
+        avg_far = (cf_in - Cc) / u
+        davg_far = (avg_far / Cc - 1.0) / u
+        cf_avg = np.where(positive, np.where(far, avg_far, 0.5 * (cf_in + Cc)), 0.0)
+        dcf_avg = np.where(positive, np.where(far, davg_far, 0.5), 0.0)
+
+    NDP = p_avg - osm_coef * cf_avg
+    Qp = np.where(NDP > 0.0, k_A * NDP, 0.0)
+    dQp = np.where(NDP > 0.0, -k_A * osm_coef * dcf_avg, 0.0)
+    Js = k_B * cf_avg
+
+    R = Cc * (qf_in - Qp) - salt_in + Js
+    dR = (qf_in - Qp) - Cc * dQp + k_B * dcf_avg
+    return R, dR, Qp, dQp, Js
+
+
+def calc_element_logmean_batch(qf_in, cf_in, pin,
+                               area_m2, A_h, B_h,
+                               dP_element, osm_coef):
+    """
+    calc_element_logmeanのNumPy配列版。複数ケースの1エレメント分をまとめて計算する。
+    入力・出力の意味はcalc_element_logmeanと同じで、各値は同じshapeの配列
+    (またはブロードキャスト可能なスカラー)とする。
+    収束したケースはその時点の値で固定し、収束判定もスカラー版と同じ手順で行うため、
+    結果は収束判定の許容差(REL_TOL)の範囲でスカラー版と一致する。
+    スカラー版がValueErrorを送出するケース(入口圧力が0以下、物理的な解が無い、
+    収束しない)は、例外の代わりに出力をすべてNaNとして返す。
+    """
+    p_out = np.maximum(pin - dP_element, 0.0)
+
+    # スカラー版でエラーとなる入力 (入口圧力0以下、上流エレメントでNaNになったケース)
+    valid = (pin > 0.0) & np.isfinite(qf_in) & np.isfinite(cf_in)
+    # 入口流量が0なら透過も起こらない (反復せずに確定する)
+    no_feed = valid & (qf_in <= 0.0)
+
+    # ログ平均圧力 (反復中は変化しない)
+    p_out_approx = np.maximum(p_out, 1e-5)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_avg = np.where(np.abs(pin - p_out_approx) > 1e-10,
+                         (pin - p_out_approx) / np.log(pin / p_out_approx),
+                         pin)
+
+    salt_in = qf_in * cf_in
+    k_A = A_h * area_m2
+    k_B = B_h * area_m2
+
+    # 解を挟む区間 [lo, hi] を求める (スカラー版と同じ手順をケースごとに行う)
+    Qp0 = k_A * np.maximum(p_avg - osm_coef * cf_in, 0.0)
+    bracketed = (k_B <= Qp0) & (Qp0 < qf_in)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lo = np.where(bracketed, cf_in, 0.0)
+        hi = np.where(bracketed, (salt_in - k_B * cf_in) / (qf_in - Qp0),
+                      np.maximum(cf_in, 1e-5))
+    for _ in range(MAX_ITER):
+        searching = valid & ~no_feed & ~bracketed
+        if not searching.any():
+            break
+        R, dR, Qp, dQp, Js = _element_balance_batch(hi, qf_in, cf_in, salt_in,
+                                                    p_avg, k_A, k_B, osm_coef)
+        found = searching & (R >= 0.0) & (Qp <= qf_in)
+        bracketed |= found
+        lo = np.where(searching & ~found, hi, lo)
+        hi = np.where(searching & ~found, hi * 2.0, hi)
+
+    # ニュートン法＋二分法 (収束したケースはその時点の評価値で固定する)
+    Cc_guess = hi.copy()
+    active = valid & ~no_feed & bracketed
+    converged = np.zeros(np.shape(qf_in), dtype=bool)
+    Qp = np.full(np.shape(qf_in), np.nan)
+    Js = np.full(np.shape(qf_in), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(MAX_ITER):
+            if not active.any():
+                break
+            R, dR, Qp_i, dQp, Js_i = _element_balance_batch(Cc_guess, qf_in, cf_in, salt_in,
+                                                            p_avg, k_A, k_B, osm_coef)
+            physical = Qp_i <= qf_in
+            exact = (R == 0.0) & physical
+            upper = (R > 0.0) & physical
+            hi = np.where(active & upper, Cc_guess, hi)
+            lo = np.where(active & ~upper, Cc_guess, lo)
+
+            Cc_new = np.where(physical & (dR > 0.0), Cc_guess - R / dR, 0.5 * (lo + hi))
+            Cc_new = np.where((Cc_new <= lo) | (Cc_new >= hi), 0.5 * (lo + hi), Cc_new)
+
+            step = np.abs(Cc_new - Cc_guess)
+            done = exact | (
+                (step < REL_TOL * np.maximum(Cc_new, 1e-5))
+                & (np.abs(dQp) * step
+                   <= REL_TOL * np.maximum(np.minimum(Qp_i, qf_in - Qp_i), 1e-12))
+            )
+            finished = active & done
+            Qp = np.where(finished, Qp_i, Qp)
+            Js = np.where(finished, Js_i, Js)
+            converged |= finished
+            active &= ~done
+            Cc_guess = np.where(active, Cc_new, Cc_guess)
+
+        # 反復後の確定値
+        Cp = np.where(Qp > 1e-12, Js / Qp, cf_in)
+        Qc = qf_in - Qp
+        Cc = np.where(Qc > 1e-12, (salt_in - Qp * Cp) / Qc, cf_in)
+
+    # 入口流量0のケースは透過なし
+    Qp = np.where(no_feed, 0.0, Qp)
+    Cp = np.where(no_feed, cf_in, Cp)
+    Qc = np.where(no_feed, qf_in, Qc)
+    Cc = np.where(no_feed, cf_in, Cc)
+
+    # 収束しなかった・物理的な解が無いケースはNaNとする (下流のエレメントもNaNになる)
+    ok = no_feed | (converged & (Qp <= qf_in) & (Js <= salt_in))
+    Qp, Cp, Qc, Cc, p_out = (np.where(ok, x, np.nan) for x in (Qp, Cp, Qc, Cc, p_out))
+
+    return Qp, Cp, Qc, Cc, p_out
 
-    # 2) タイムスタンプを付与してリストに追加
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def simulate_ro_logmean_batch(
+    feed_flow,
+    feed_tds,
+    feed_press,
+    temperature,
+    product_name,
+    num_elements,
+    membrane_data
+):
+    """
+    simulate_ro_logmeanのNumPy配列版。
+    feed_flow, feed_tds, feed_press, temperature に配列を渡すと、
+    全ケースを一括で計算し、simulate_ro_logmeanと同じキーで配列の値を持つ辞書を返す。
+    (各入力はブロードキャスト可能であればよい。product_name, num_elementsは全ケース共通)
+    simulate_ro_logmeanがValueErrorを送出する入力(容器内で圧力が0になる、
+    物理的な解が無いなど)では、そのケースの計算結果をNaNとする。
+    """
+    # 1) 製品のスペックを取得
+    try:
+        spec = membrane_data[product_name]
+    except KeyError:
+        raise ValueError(f"Product '{product_name}' not found in membrane data.") from None
+    A_value = spec.A_value
+    B_value = spec.B_value
+    area_m2 = spec.area_m2
+    dP_element = spec.default_dP_element
+    osm_coef = spec.default_osm_coef
+
+    feed_flow, feed_tds, feed_press, temperature = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (feed_flow, feed_tds, feed_press, temperature))
+    )
+
+    # 2) 温度補正 (simulate_ro_logmeanと同じ)
+    ref_temp = 25.0
+    factor_per_deg = 0.03
+    tcf = np.maximum(1.0 + factor_per_deg * (temperature - ref_temp), 0.0)
+    A_h = A_value * tcf * 3600.0
+    B_h = B_value * tcf * 3600.0
+
+    # 3) エレメント直列計算 (エレメント方向は逐次、ケース方向は配列で一括)
+    q_in = feed_flow
+    c_in = feed_tds
+    p_in = feed_press
+
+    total_permeate = np.zeros_like(feed_flow)
+    total_salt_perm = np.zeros_like(feed_flow)
+
+    for i in range(num_elements):
+        Qp, Cp, Qc, Cc, p_out = calc_element_logmean_batch(
+            qf_in=q_in,
+            cf_in=c_in,
+            pin=p_in,
+            area_m2=area_m2,
+            A_h=A_h,
+            B_h=B_h,
+            dP_element=dP_element,
+            osm_coef=osm_coef
+        )
+        total_permeate += Qp
+        total_salt_perm += (Qp * Cp)
+
+        q_in = Qc
+        c_in = Cc
+        p_in = p_out
+
+    # (比較を<=にして、NaNのケースは0.0ではなくNaNのまま残す)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recovery = np.where(feed_flow <= 1e-12, 0.0, total_permeate / feed_flow * 100.0)
+        permeate_tds = np.where(total_permeate <= 1e-12, 0.0, total_salt_perm / total_permeate)
+
+    result = {}
+    result["Selected_Product"]    = product_name
+    # 入力配列は呼び出し元と共有しないようコピーして返す
+    result["FeedFlow_m3/h"]       = feed_flow.copy()
+    result["FeedTDS_mg/L"]        = feed_tds.copy()
+    result["Temperature_degC"]    = temperature.copy()
+    result["Number_of_Elements"]  = num_elements
+    result["PermeateFlow_m3/h"]   = total_permeate
+    result["Recovery_%"]          = recovery
+    result["PermeateTDS_mg/L"]    = permeate_tds
+    result["ConcentrateFlow_m3/h"] = q_in
+    result["ConcentrateTDS_mg/L"]  = c_in
+    result["FinalPressure_bar"]    = p_in
+
+    return result
+
+
+# ================================
+# JSON Lines形式での履歴管理機能
+# ================================
+def append_result_to_json(result_dict, json_path="calculation_history.jsonl"):
+    """
+    計算結果をJSON Lines形式(1行1レコード)でファイルに追記する。
+    - ファイルが存在しない場合は新規作成。
+    - 既存の履歴は読み込まず末尾に1行追記するだけなので、履歴件数に依存せず一定時間で書き込める。
+    """
+    # タイムスタンプを付与
+    now_str = time.strftime("%Y-%m-%d %H:%M:%S")
     row = {
         "Timestamp": now_str,
         **result_dict  # result_dictの内容を展開
     }
-    data.append(row)
 
-    # 3) JSONに書き戻し
-    with open(json_path, "w", encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # 1行分のJSONとして追記 (orjsonはUTF-8のbytesを返すためバイナリモードで書き込む)
+    with open(json_path, "ab") as f:
+        f.write(orjson.dumps(row) + b"\n")
 
 
-def load_calculation_history(json_path="calculation_history.json"):
+def load_calculation_history(json_path="calculation_history.jsonl"):
     """
-    JSONファイルから計算履歴をロードし、リストで返す。
-    - ファイルが無ければ空リストを返す。
+    JSON Lines形式のファイルから計算履歴をロードし、DataFrameで返す。
+    - 同じ名前で拡張子が.jsonの旧形式(JSON配列)の履歴ファイルがあれば、その内容を先頭に含める。
+    - どちらのファイルも無ければ空のDataFrameを返す。
     """
-    if not os.path.isfile(json_path):
-        return []
+    data = []
+
+    # 旧形式 (JSON Lines化する前の calculation_history.json) の履歴
+    legacy_path = os.path.splitext(json_path)[0] + ".json"
+    if legacy_path != json_path and os.path.isfile(legacy_path):
+        with open(legacy_path, "rb") as f:
+            content = f.read()
+        if content.strip():
+            data.extend(orjson.loads(content))
+
+    if os.path.isfile(json_path):
+        with open(json_path, "rb") as f:
+            lines = [line for line in f if line.strip()]
 
-    with open(json_path, "r", encoding='utf-8') as f:
-        data = json.load(f)
+        # 全行を1つのJSON配列として一括デコードする
+        data.extend(orjson.loads(b"[" + b",".join(lines) + b"]"))
 
-    return data
+    return pd.DataFrame(data)
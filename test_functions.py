@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pytest
+
+from functions import load_membrane_specs, simulate_ro_logmean, simulate_ro_logmean_batch
+
+SPECS_PATH = os.path.join(os.path.dirname(__file__), "membrane_specs.yaml")
+
+
+@pytest.fixture(scope="module")
+def specs():
+    return load_membrane_specs(SPECS_PATH)
+
+
+# 既定の入力 (30 m3/h, 2000 mg/L, 15.5 bar, 25 degC, 4本) での変更前の計算結果
+BASELINE_DEFAULTS = {
+    "CPA5-LD": (6.107254178411248, 6.834156385474545, 2509.475575456148, 14.700000000000003),
+    "ESPA2-LD": (7.482036692774238, 6.594484054878498, 2662.3482332922185, 14.899999999999999),
+    "ESPA2-MAX": (9.618705991634618, 5.785075856937605, 2941.1456913181764, 14.899999999999999),
+}
+
+
+@pytest.mark.parametrize("product_name", sorted(BASELINE_DEFAULTS))
+def test_default_inputs_match_baseline(specs, product_name):
+    r = simulate_ro_logmean(30.0, 2000.0, 15.5, 25.0, product_name, 4, specs)
+    permeate_flow, permeate_tds, concentrate_tds, final_pressure = BASELINE_DEFAULTS[product_name]
+    assert r["PermeateFlow_m3/h"] == pytest.approx(permeate_flow, rel=1e-6)
+    assert r["PermeateTDS_mg/L"] == pytest.approx(permeate_tds, rel=1e-6)
+    assert r["ConcentrateTDS_mg/L"] == pytest.approx(concentrate_tds, rel=1e-6)
+    assert r["FinalPressure_bar"] == pytest.approx(final_pressure, rel=1e-12)
+
+
+def test_non_positive_inlet_pressure_raises(specs):
+    # 8本目に達する前に圧力損失で入口圧力が0になる
+    with pytest.raises(ValueError, match="inlet pressure"):
+        simulate_ro_logmean(0.5, 2000.0, 0.5, 25.0, "CPA5-LD", 8, specs)
+
+
+def test_no_physical_solution_raises(specs):
+    # 低流量・高圧では供給水をすべて透過させてしまう
+    with pytest.raises(ValueError, match="No physical solution"):
+        simulate_ro_logmean(5.0, 500.0, 8.0, 30.0, "CPA5-LD", 8, specs)
+
+
+def test_zero_feed_flow(specs):
+    r = simulate_ro_logmean(0.0, 2000.0, 15.5, 25.0, "CPA5-LD", 4, specs)
+    assert r["PermeateFlow_m3/h"] == 0.0
+    assert r["Recovery_%"] == 0.0
+    assert r["ConcentrateFlow_m3/h"] == 0.0
+    assert r["ConcentrateTDS_mg/L"] == 2000.0
+
+
+def test_high_recovery_keeps_mass_balance(specs):
+    # 回収率が100%に近く、固定回数の反復では振動して収束しなかった条件
+    feed_flow, feed_tds = 1.0, 10000.0
+    r = simulate_ro_logmean(feed_flow, feed_tds, 5.0, 35.0, "ESPA2-MAX", 8, specs)
+    assert 0.0 < r["Recovery_%"] < 100.0
+    assert r["ConcentrateFlow_m3/h"] > 0.0
+    assert r["PermeateFlow_m3/h"] + r["ConcentrateFlow_m3/h"] == pytest.approx(feed_flow)
+    salt_out = (r["PermeateFlow_m3/h"] * r["PermeateTDS_mg/L"]
+                + r["ConcentrateFlow_m3/h"] * r["ConcentrateTDS_mg/L"])
+    assert salt_out == pytest.approx(feed_flow * feed_tds)
+
+
+BATCH_KEYS = ("PermeateFlow_m3/h", "Recovery_%", "PermeateTDS_mg/L",
+              "ConcentrateFlow_m3/h", "ConcentrateTDS_mg/L", "FinalPressure_bar")
+
+
+def _sweep_cases():
+    rng = np.random.default_rng(0)
+    n = 300
+    feed_flow = np.concatenate([rng.uniform(0.1, 5.0, n // 2), rng.uniform(0.5, 100.0, n // 2)])
+    feed_tds = rng.uniform(0.0, 50000.0, n)
+    feed_press = rng.uniform(0.1, 80.0, n)
+    temperature = rng.uniform(0.0, 50.0, n)
+    # 既定値、入口圧力0、物理的な解が無い、入口流量0、TDS 0 のケースも含める
+    extra = np.array([(30.0, 2000.0, 15.5, 25.0), (0.5, 2000.0, 0.5, 25.0),
+                      (5.0, 500.0, 8.0, 30.0), (0.0, 2000.0, 15.5, 25.0),
+                      (10.0, 0.0, 15.0, 25.0)])
+    return tuple(np.concatenate([x, e]) for x, e in
+                 zip((feed_flow, feed_tds, feed_press, temperature), extra.T))
+
+
+@pytest.mark.parametrize("num_elements", [1, 4, 8])
+@pytest.mark.parametrize("product_name", sorted(BASELINE_DEFAULTS))
+def test_batch_matches_scalar(specs, product_name, num_elements):
+    cases = _sweep_cases()
+    b = simulate_ro_logmean_batch(*cases, product_name, num_elements, specs)
+    n_errors = 0
+    for i, case in enumerate(zip(*cases)):
+        try:
+            r = simulate_ro_logmean(*map(float, case), product_name, num_elements, specs)
+        except ValueError:
+            # スカラー版がエラーになるケースは、バッチ版ではすべてNaN
+            n_errors += 1
+            assert all(np.isnan(b[k][i]) for k in BATCH_KEYS), case
+            continue
+        for k in BATCH_KEYS:
+            # 収束判定の打ち切り位置の違いで、最大でも許容差(REL_TOL)程度しかずれない
+            assert b[k][i] == pytest.approx(r[k], rel=1e-5, abs=1e-9), (case, k)
+    assert n_errors > 0
+
+
+def test_batch_does_not_alias_inputs(specs):
+    feed_flow = np.array([30.0, 20.0])
+    feed_tds = np.array([2000.0, 3000.0])
+    temperature = np.array([25.0, 15.0])
+    b = simulate_ro_logmean_batch(feed_flow, feed_tds, 15.5, temperature, "CPA5-LD", 4, specs)
+    for key, x in (("FeedFlow_m3/h", feed_flow), ("FeedTDS_mg/L", feed_tds),
+                   ("Temperature_degC", temperature)):
+        assert not np.shares_memory(b[key], x)